@@ -1,11 +1,12 @@
 import numpy as np
 import enum
-import pickle
+import functools
 import threading
-from time import sleep
 from PyQt5.QtCore import QObject
 from PyQt5.QtCore import pyqtSignal
 
+from core.field_model import evaluate_model
+
 
 @enum.unique
 class CURRENT_TASK(enum.Enum):
@@ -27,48 +28,69 @@ class MAGNET_STATE(enum.Enum):
     OFF = 2
 
 
+# relative vertices of the damped oscillation applied for demagnetization, with alternating signs and zero at the end.
+# Shared by all backends, st. they follow the same demagnetization schedule
+DEMAG_FACTORS = np.append(np.exp(-0.7 * np.array([0.2, 1, 2, 3, 4, 5, 6, 7, 8])) * (-1)**np.arange(1, 10), 0.0)
+
+
+@functools.lru_cache(maxsize=512)
+def _predict(filepath: str, x: float, y: float, z: float) -> tuple:
+    """Evaluate the model stored at filepath for a single input vector (x, y, z). 
+    Results are cached, st. returning to a previous setpoint does not require a new prediction.
+
+    :param filepath: path of the pickled [model, polynomial features] pair
+    :returns: prediction of the model, rounded to 3 decimals
+    """
+    return tuple(np.round(evaluate_model(filepath, (x, y, z)), 3))
+
+
 class CurrentLimitExceeded(Exception):
     """Raised when a value that is larger than a given limit should be set.
     """
     pass
 
-class ObserverThread(threading.Thread):
-    """Thread class that checks whether ramping threads are still alive.
+class TaskObserver(object):
+    """Keeps track of the ramping threads of a task and sends a signal once all of them have finished.
+    Instead of polling the threads, each thread reports its progress by calling the respective methods.
 
     """
-    def __init__(self, subjects : np.ndarray, running_task : CURRENT_TASK, signal : pyqtSignal, 
-                    check_demagnetization = False, *args, **kwargs):
+    def __init__(self, number_subjects : int, running_task : CURRENT_TASK, signal : pyqtSignal, 
+                    check_demagnetization = False):
         """
         Instance constructor.
         
-        :param subjects: list or array containing all threads that are under surveillance
+        :param number_subjects: number of threads (or jobs) that are under surveillance
         :param running_task: currently running task
-        :param signal: signal that is emitted when all threads in subjects have finished or demagnetization has been completed
-        :param check_demagnetization: If True, also check whether all threads have passed the demagnetization stage and emit 
-            a signal once this is the case. 
+        :param signal: signal that is emitted when all subjects have finished or demagnetization has been completed
+        :param check_demagnetization: If True, also emit a signal once all subjects have passed the demagnetization stage. 
         """
-        super().__init__(*args, **kwargs)
-
-        # initialize variables 
-        self._subjects = subjects
         self._running_task = running_task
         self._signal = signal
         self._check_demag = check_demagnetization
 
+        # number of subjects which have not passed the demagnetization stage yet or have not finished yet
+        self._pending_demagnetization = number_subjects
+        self._pending = number_subjects
+        self._lock = threading.Lock()
 
-    def run(self):
-        """Check whether threads are still alive and send a signal at the end. 
+
+    def demagnetization_passed(self):
+        """Report that a subject has passed the demagnetization stage. Must be called once per subject.
         """
-        if self._check_demag:
-            while(np.any([thread.is_alive() and not thread.demagnetization_completed() for thread in self._subjects])):
-                sleep(0.1)
-            self._signal.emit(CURRENT_TASK.DEMAGNETIZING)
+        with self._lock:
+            self._pending_demagnetization -= 1
+            if self._check_demag and self._pending_demagnetization == 0:
+                self._signal.emit(CURRENT_TASK.DEMAGNETIZING)
 
-        while(np.any([thread.is_alive() for thread in self._subjects])):
-            sleep(0.1)
 
-        # emit signal to herald that task has finished
-        self._signal.emit(self._running_task)
+    def finished(self):
+        """Report that a subject has finished. Must be called once per subject, after demagnetization_passed.
+        """
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                # emit signal to herald that task has finished
+                self._signal.emit(self._running_task)
 
 class MagnetBackendBase(QObject):
     """Vector magnet backend base class.
@@ -93,6 +115,23 @@ class MagnetBackendBase(QObject):
     filename_model_B2I = 'model_poly3_final_B2I.sav'
     filename_model_I2B = 'model_poly3_final_I2B.sav'
 
+    def __init__(self, *args, **kwargs):
+        """Instance constructor. The models relating fields and currents are loaded on first use 
+        and cached afterwards, st. they need not be read from disk whenever a new setpoint is computed.
+        """
+        super().__init__(*args, **kwargs)
+
+        self._filepath_B2I = f'./fitting_parameters/{self.filename_model_B2I}'
+        self._filepath_I2B = f'./fitting_parameters/{self.filename_model_I2B}'
+
+    def close(self):
+        """Stop running tasks and release the resources of the backend. 
+        It is safe to call this method multiple times.
+
+        """
+        raise NotImplementedError()
+
+
     def get_currents(self) -> np.ndarray:
         """Returns currents of power supplies.
 
@@ -153,7 +192,8 @@ class MagnetBackendBase(QObject):
 
         """
         if cartesian:
-            return self._setpoint_fields
+            # return a copy, since the setpoint buffer is updated in place
+            return self._setpoint_fields.copy()
         else:
             return self.cartesian_to_spherical(self._setpoint_fields)
 
@@ -177,7 +217,7 @@ class MagnetBackendBase(QObject):
             
             # set required currents
             self.set_currents(required_currents)
-            self._setpoint_fields = cartesian_values
+            np.copyto(self._setpoint_fields, cartesian_values)
 
 
     @staticmethod
@@ -193,11 +233,13 @@ class MagnetBackendBase(QObject):
         # explicitly define spherical coordinates to prevent misconfusions
         magnitude, theta, phi = spherical_coords
 
-        cartesian_vector = np.array([  np.sin(np.radians(theta)) * np.cos(np.radians(phi)),
-                                        np.sin(np.radians(theta)) * np.sin(np.radians(phi)),
-                                        np.cos(np.radians(theta))])
+        # evaluate each trigonometric function only once, note that the resulting vector 
+        # (sin(theta)cos(phi), sin(theta)sin(phi), cos(theta)) is already normalized
+        theta, phi = np.radians(theta), np.radians(phi)
+        sin_theta, cos_theta = np.sin(theta), np.cos(theta)
+        sin_phi, cos_phi = np.sin(phi), np.cos(phi)
 
-        cartesian_vector = magnitude* cartesian_vector / np.linalg.norm(cartesian_vector)
+        cartesian_vector = magnitude * np.array([sin_theta * cos_phi, sin_theta * sin_phi, cos_theta])
         return np.around(cartesian_vector, 3)
 
 
@@ -226,17 +268,11 @@ class MagnetBackendBase(QObject):
         :returns: current vectors [A] required to generate magnetic_field_vector 
         :rtype: 1d np.ndarray of length 3
         """
-        # load the model from disk
-        filepath = f'./fitting_parameters/{self.filename_model_B2I}'
-        [loaded_model, loaded_poly] = pickle.load(open(filepath, 'rb'))
-
-        # preprocess test vectors, st. they have correct shape for model
-        input_vector_ = loaded_poly.fit_transform(magnetic_field_vector.reshape((1, 3)))
+        # round inputs to the precision of the setpoints, st. identical setpoints hit the cache
+        magnetic_field_vector = np.round(magnetic_field_vector, 3)
 
         # estimate prediction of required currents
-        current_vector = loaded_model.predict(input_vector_)
-        
-        return np.round(current_vector.reshape(3), 3)
+        return np.array(_predict(self._filepath_B2I, *magnetic_field_vector))
 
 
     def _compute_magnetic_field(self, current_vector: np.ndarray) -> np.ndarray:
@@ -248,14 +284,8 @@ class MagnetBackendBase(QObject):
         :returns: expected field vector [mT] in Cartesian coordinates generated by the applied currents 
         :rtype: 1d np.ndarray of length 3
         """
-        # load the model from disk
-        filepath = f'./fitting_parameters/{self.filename_model_I2B}'
-        [loaded_model, loaded_poly] = pickle.load(open(filepath, 'rb'))
-
-        # preprocess test vectors, st. they have correct shape for model
-        input_vector_ = loaded_poly.fit_transform(current_vector.reshape((1, 3)))
+        # round inputs to the precision of the currents, st. identical inputs hit the cache
+        current_vector = np.round(current_vector, 3)
 
         # estimate prediction of generated field
-        magnetic_field_vector = loaded_model.predict(input_vector_)
-
-        return np.round(magnetic_field_vector.reshape(3), 3)
\ No newline at end of file
+        return np.array(_predict(self._filepath_I2B, *current_vector))
\ No newline at end of file
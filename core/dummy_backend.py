@@ -1,11 +1,12 @@
 import numpy as np
 import threading 
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic
 from PyQt5.QtCore import pyqtSignal
 import logging 
 logging.basicConfig(level=logging.DEBUG)
 
-from core.backend_base import MagnetBackendBase, ObserverThread
+from core.backend_base import MagnetBackendBase, DEMAG_FACTORS
 from core.backend_base import MAGNET_STATE as MagnetState
 from core.backend_base import CURRENT_TASK as CurrentTask
 
@@ -24,9 +25,14 @@ class DummyMagnetBackend(MagnetBackendBase):
         """
         super().__init__()
 
-        # Initialise state.
-        self._setpoint_currents = np.array([0, 0, 0], dtype=float)
+        # Initialise state, setpoints are preallocated and updated in place, zero currents are a shared read-only array
+        self._zeros = np.zeros(3, dtype=float)
+        self._zeros.flags.writeable = False
+        self._setpoint_currents = np.zeros(3, dtype=float)
         self._actual_currents = np.array([0, 0, 0], dtype=float)
+
+        # lock protecting the actual currents, which are updated by the ramping worker and read by the GUI
+        self._currents_lock = threading.Lock()
         self._setpoint_fields = np.array([0, 0, 0], dtype=float)
         self._magnet_state = MagnetState.OFF
         self._demagnetization_flag = False
@@ -34,22 +40,44 @@ class DummyMagnetBackend(MagnetBackendBase):
         self.maxCurrent = 5.05
         self.maxVoltage = 30
 
-        # thread pool for ramping
-        self.ramping_threads = np.empty(3, dtype = CurrentRampingThread)
+        # single persistent worker thread for ramping all channels, which executes the submitted jobs
+        self._ramp_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ramp')
+        self._ramp_stop_event = threading.Event()
+        self._ramper = CurrentRamper(self._actual_currents, self._ramp_stop_event, self._currents_lock)
+
+        # job that has most recently been submitted to the worker and its future
+        self._ramping_job = None
+        self._ramp_future = None
+        self._closed = False
 
         # catch signal emitted when a task is finished
         self.on_task_finished.connect(self.on_task_finished_action)
 
-    def __del__(self):
+    def close(self):
         """Shut down 
         """
         logging.debug(f'BAK :: magnet ({self.name})) :: Shutdown')
+        self._closed = True
+
+        # stop running job and let the worker exit
+        self._ramp_stop_event.set()
+        self._ramp_pool.shutdown(wait=False)
+
+    def __del__(self):
+        """Best-effort cleanup, prefer calling close explicitly.
+        """
+        try:
+            self.close()
+        except Exception:
+            pass
 
     def get_currents(self) -> np.ndarray:
-        """Returns currents of (dummy) power supplies.
+        """Returns currents of (dummy) power supplies. 
 
         """
-        return np.round(self._actual_currents, 3)
+        # return a new array, since callers may modify or keep the result
+        with self._currents_lock:
+            return np.round(self._actual_currents, 3)
 
 
     def set_currents(self, values: np.ndarray):
@@ -58,9 +86,13 @@ class DummyMagnetBackend(MagnetBackendBase):
         :param values: Current values to be set.
         """
         logging.debug(f'BAK :: magnet ({self.name})) :: set_currents: {values}')
-        self._setpoint_currents = values
+        values = np.asarray(values, dtype=float)
 
-        if self._magnet_state == MagnetState.ON:
+        # skip ramping if the setpoint has not changed, unless a demagnetization is requested
+        unchanged = np.allclose(values, self._setpoint_currents, rtol=0, atol=1e-4) and not self._demagnetization_flag
+        np.copyto(self._setpoint_currents, values)
+
+        if self._magnet_state == MagnetState.ON and not unchanged:
             self.on_task_change.emit(CurrentTask.SWITCHING)
             self._ramp_to_new_current_values(self._setpoint_currents, CurrentTask.SWITCHING)
 
@@ -87,7 +119,7 @@ class DummyMagnetBackend(MagnetBackendBase):
         self.on_field_status_change.emit(MagnetState.OFF)
 
         # bring currents to zero and emit signals in each step since automatic update of displayed currents is off now
-        self._ramp_to_new_current_values(np.array([0, 0, 0], dtype=float), CurrentTask.DISABLING, emit_signals_flag = True)
+        self._ramp_to_new_current_values(self._zeros, CurrentTask.DISABLING, emit_signals_flag = True)
 
 
     def get_magnet_status(self) -> MagnetState:
@@ -148,17 +180,21 @@ class DummyMagnetBackend(MagnetBackendBase):
             This flag is intented to be used when disabling the magnet, since current updates should be switched off 
             when the magnet is off, but the process of driving the currents to zero should still be monitored.
         """
-        try:
-            # if threads are still running, initiate early stop by setting stop
-            for thread in self.ramping_threads:
-                if thread.is_alive():
-                    thread.stop()
-
-            # wait until all threads have exited 
-            for thread in self.ramping_threads:
-                thread.join()
-        except AttributeError:
-            pass
+        # the worker is shut down once the backend is closed
+        if self._closed:
+            logging.debug(f'BAK :: magnet ({self.name})) :: closed, ignore request to ramp currents')
+            return
+
+        # if a job is still running, initiate early stop by setting the stop event
+        self._ramp_stop_event.set()
+
+        # wait until the job has been finished, then rearm the stop event for the next job.
+        # A failed job must not block subsequent ones, hence only report its exception
+        if self._ramp_future is not None:
+            wait([self._ramp_future])
+            if self._ramp_future.exception() is not None:
+                logging.error(f'BAK :: magnet ({self.name})) :: previous ramping job failed: {self._ramp_future.exception()!r}')
+        self._ramp_stop_event.clear()
         
         # emit signal to herald a new task
         if self._demagnetization_flag:
@@ -166,143 +202,197 @@ class DummyMagnetBackend(MagnetBackendBase):
         else:
             self.on_task_change.emit(running_task)
 
-        # if desired, pass the on_current_change attribute to the individual threads
+        # if desired, pass the on_current_change attribute to the job
         if emit_signals_flag:
             signal = self.on_single_current_change
         else:
             signal = None
 
-        # initialize threads that ramp current from initial to final value
-        for i in range(3):
-            self.ramping_threads[i] = CurrentRampingThread(self._actual_currents, i, target_currents[i], 
-                    number_steps = self.ramp_num_steps, signal = signal,
-                    demagnetization_flag = self._demagnetization_flag)
-
-        # start the threads
-        for thread in self.ramping_threads:
-            thread.start()
+        # estimate step sizes of all channels, note that the demagnetization procedure ends at zero currents
+        if self._demagnetization_flag:
+            initial_currents = np.zeros(3, dtype=float)
+        else:
+            with self._currents_lock:
+                initial_currents = self._actual_currents.copy()
+        step_sizes = (np.asarray(target_currents, dtype=float) - initial_currents) / self.ramp_num_steps
 
-        # start the observer of the three threads
-        self.observer = ObserverThread(self.ramping_threads, running_task, self.on_task_finished, 
-                    check_demagnetization = self._demagnetization_flag)
-        self.observer.start()
+        # initialize job that ramps currents from initial to final values and submit it to the worker,
+        # which also reports the finished task, st. no additional observer thread is required
+        self._ramping_job = RampingJob(step_sizes, number_steps = self.ramp_num_steps, 
+                                        signal = signal, demagnetization_flag = self._demagnetization_flag,
+                                        running_task = running_task, task_signal = self.on_task_finished)
+        self._ramp_future = self._ramp_pool.submit(self._ramper.run, self._ramping_job)
 
 
-class CurrentRampingThread(threading.Thread):
-    """Thread class that ramps the currents stored in an array from initial to final values. 
-    The class has a stop method, which invokes an early but secure termination after finishing 
-    the currently executed ramping step.  
+class RampingJob(object):
+    """Parameters and state of ramping the currents of all channels from their actual to final values. 
+    Jobs are executed by a CurrentRamper, which reports the progress via the job's task signal.
 
     """
 
-    def __init__(self, target_array : np.ndarray, channel : int, target_value : float, 
-                    signal : pyqtSignal = None, demagnetization_flag = False,
-                    number_steps: int = 5, *args, **kwargs):
+    def __init__(self, step_sizes : np.ndarray, signal : pyqtSignal = None, demagnetization_flag = False,
+                    number_steps: int = 5, running_task : CurrentTask = None, task_signal : pyqtSignal = None):
         """
         Instance constructor.
         
-        :param target_array: Array containing the actual currents. This argument is only required for the dummy backend.
-        :param channel: Channel number, which is the index of target_array at which the current value should be updated.
-        :param target_value: Target current value which should be obtained at the end
+        :param step_sizes: Step sizes of all channels, which lead to the target currents after the given number of steps
         :param number_steps: Number of steps used for ramping.
         :param signal (optional): pyqtSignal to emit after each step. The signal argument must be of types (float, int).
-        :param demagnetization_flag (optional): If flag is True, a demagnetization procedure is applied to the coi prior to ramping.
+        :param demagnetization_flag (optional): If flag is True, a demagnetization procedure is applied to the coils prior to ramping.
+        :param running_task (optional): Task that is performed by the job.
+        :param task_signal (optional): pyqtSignal of type CurrentTask, which is emitted with the running task once the job
+            has finished and with CurrentTask.DEMAGNETIZING once the demagnetization stage has been passed.
         """
-        super().__init__(*args, **kwargs)
+        self.step_sizes = step_sizes
+        self.number_steps = number_steps
+        self.signal = signal
+        self.demagnetization_flag = demagnetization_flag
+        self.running_task = running_task
+        self.task_signal = task_signal
+
+
+    def notify(self, task : CurrentTask):
+        """Emit the task signal with the provided task, if the job provides a task signal.
+        """
+        if self.task_signal is not None:
+            self.task_signal.emit(task)
+
 
+class CurrentRamper(object):
+    """Ramps the currents of all channels stored in an array from initial to final values by executing RampingJobs. 
+    All channels are updated at once in each step. Jobs are meant to be run one after another by a single worker thread. 
+    Setting the stop event invokes an early but secure termination of the running job after finishing 
+    the currently executed ramping step.  
+
+    """
+
+    def __init__(self, target_array : np.ndarray, stop_event : threading.Event, lock : threading.Lock):
+        """
+        Instance constructor.
+        
+        :param target_array: Array containing the actual currents. This argument is only required for the dummy backend.
+        :param stop_event: Event which terminates the running job early once it is set.
+        :param lock: Lock which protects the target array against concurrent access.
+        """
         # initialize variables 
         self._target_array = target_array
-        self._channel = channel
-        self._number_steps = number_steps
-        self._target_value = target_value
-        self._signal = signal
-        self._demagnetization_flag = demagnetization_flag
-        self._demagnetization_passed = False
-        self._stop_event = threading.Event()
+        self._stop_event = stop_event
+        self._lock = lock
 
         # define a factor [s/A] relating sleeping duration with step size to mimic hardware's latency
         self._duration_factor = 1
 
+        # upper bound [s] of the sleeping duration per step, st. large steps do not block for too long
+        self._max_sleep_duration = 1.0
+
+        # minimum interval [s] between two signals, st. the GUI is not flooded with updates
+        self._emit_interval = 0.05
+        self._last_emit = 0.0
 
-    def run(self):
-        """Overwrite run method to define the thread's purpose. If a stop event is set while the thread is running, 
-        the current ramping step is finalized and the thread will be terminated before starting the next ramping step. 
-        """
-        # if desired run the demagnetization procedure first
-        if self._demagnetization_flag and not np.isclose(0, self._target_array[self._channel]):
-            self._demagnetization_procedure()
-        self._demagnetization_passed = True
 
-        # estimate current distance to target and set step size
-        step_size = (self._target_value - self._target_array[self._channel]) / self._number_steps
+    def run(self, job : RampingJob):
+        """Execute the provided job. 
+        """
+        try:
+            self._ramp(job)
 
-        # estimate sleep duration to mimic hardware
-        sleep_duration = abs(step_size) * self._duration_factor
+            # always send the final values
+            if job.signal is not None:
+                with self._lock:
+                    snapshot = self._target_array.copy()
+                self._emit(job, snapshot)
+        finally:
+            # herald that task has finished
+            job.notify(job.running_task)
 
-        for _ in range(self._number_steps):
-            # exit loop if stop event has been set
-            if self._stop_event.is_set():
-                break
 
-            # update target array storing the currents at index given by _channel 
-            self._target_array[self._channel] += step_size
+    def _ramp(self, job : RampingJob):
+        """Ramp the currents to the job's target values. If the stop event is set while ramping, 
+        the current ramping step is finalized and the job will be terminated before starting the next ramping step. 
+        """
+        # if desired run the demagnetization procedure first
+        if job.demagnetization_flag and np.abs(self._target_array).max() > 1e-8:
+            self._demagnetization_procedure(job)
+        if job.demagnetization_flag:
+            job.notify(CurrentTask.DEMAGNETIZING)
 
-            # send a signal with array of current values as arguments if provided
-            if self._signal is not None:
-                self._signal.emit(self._target_array[self._channel], self._channel)
+        # exit if stop event has been set during demagnetization
+        if self._stop_event.is_set():
+            return
 
-            # wait for the hardware to execute the task    
-            sleep(sleep_duration)
+        self._apply_steps(job, job.step_sizes, self._sleep_duration(job.step_sizes))
 
 
-    def stop(self):
-        """Set the stop event. 
+    def _sleep_duration(self, step_sizes : np.ndarray) -> float:
+        """Estimate the sleeping duration of a step to mimic hardware's latency, 
+        which is given by the largest step size among the channels.
         """
-        self._stop_event.set()
-    
+        return min(np.max(np.abs(step_sizes)) * self._duration_factor, self._max_sleep_duration)
 
-    def demagnetization_completed(self) -> bool:
-        """Return whether demagnetization has been completed. 
+
+    def _apply_steps(self, job : RampingJob, step_sizes : np.ndarray, sleep_duration : float) -> bool:
+        """Add the step sizes to the currents of all channels for the job's number of steps.
+
+        :returns: True if the stop event has been set during ramping, else False
         """
-        return self._demagnetization_passed
+        # hoist lookups out of the loop
+        currents = self._target_array
+        lock = self._lock
+        wait = self._stop_event.wait
 
+        for _ in range(job.number_steps):
+            # update array storing the currents of all channels, take a consistent snapshot only if it is sent
+            with lock:
+                currents += step_sizes
+                snapshot = currents.copy() if self._emit_due(job) else None
 
-    def _demagnetization_procedure(self):
-        """Apply a demagnetization procedure, which performs an approximation of a damped oscillation.
-        Eventually, zero current is applied and the remnant magnetization ideally zero, too. 
-        The initial amplitude is the currently applied current. 
+            # send a signal with the current values as argument if due
+            if snapshot is not None:
+                self._emit(job, snapshot)
 
-        """   
-        # initialize vertices of damped osciallation which are to be approached during the procedure
-        reference_points = np.array([0.2, 1, 2, 3, 4, 5, 6, 7, 8])
-        factors = np.exp(-0.7 * reference_points)
+            # wait for the hardware to execute the task, exit immediately if stop event is set meanwhile
+            if wait(sleep_duration):
+                return True
 
-        # estimate vertices of oscillation and alternatingly flip sign of amplitude
-        vertices = self._target_array[self._channel] * factors * (-1)**np.arange(1, len(factors)+1)
+        return False
 
-        # add zero at the end
-        vertices = np.append(vertices, 0)
 
-        for i in range(len(vertices)):
+    def _emit_due(self, job : RampingJob) -> bool:
+        """Return whether signals should be sent, which is the case if the job provides a signal 
+        and the previous signals are older than the emit interval. This limits the number of signals.
+        """
+        return job.signal is not None and monotonic() - self._last_emit >= self._emit_interval
 
-            step_size = (vertices[i] - self._target_array[self._channel]) / self._number_steps
-            sleep_duration = abs(step_size) * self._duration_factor
 
-            for _ in range(self._number_steps):
-                # exit loop if stop event has been set
-                if self._stop_event.is_set():
-                    break
+    def _emit(self, job : RampingJob, currents : np.ndarray):
+        """Send the provided currents of all channels via the job's signal.
 
-                # update target array storing the currents at index given by _channel 
-                self._target_array[self._channel] += step_size
+        :param currents: Snapshot of the currents of all channels.
+        """
+        # convert to Python floats once, st. no NumPy scalars are passed across the thread boundary
+        for channel, current in enumerate(currents.tolist()):
+            job.signal.emit(current, channel)
+        self._last_emit = monotonic()
 
-                # send a signal with array of current values as arguments if provided
-                if self._signal is not None:
-                    self._signal.emit(self._target_array[self._channel], self._channel)
 
-                # add an artificial sleep to mimic the hardware's latency
-                sleep(sleep_duration)
+    def _demagnetization_procedure(self, job : RampingJob):
+        """Apply a demagnetization procedure, which performs an approximation of a damped oscillation.
+        Eventually, zero current is applied and the remnant magnetization ideally zero, too. 
+        The initial amplitudes are the currently applied currents. 
 
-            # this sleep is also in hardware backend to ensure that vertex is actually approached
-            sleep(0.1)
+        """   
+        with self._lock:
+            initial_currents = self._target_array.copy()
+
+        # estimate vertices of oscillation for all channels, the last vertex is zero
+        vertices = np.outer(DEMAG_FACTORS, initial_currents)
 
+        # estimate step sizes towards each vertex at once
+        step_sizes = np.diff(np.vstack([initial_currents, vertices]), axis=0) / job.number_steps
+        for i in range(len(vertices)):
+            if self._apply_steps(job, step_sizes[i], self._sleep_duration(step_sizes[i])):
+                return
+
+            # this sleep is also in hardware backend to ensure that vertex is actually approached
+            if self._stop_event.wait(0.1):
+                return
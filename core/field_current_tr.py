@@ -10,11 +10,12 @@
 # latest update: 23.03.2021
 
 # Standard library imports 
-import pickle
+import math
 import numpy as np
 import pandas as pd
-from sklearn import linear_model
-from sklearn.preprocessing import PolynomialFeatures
+
+# Local imports
+from core.field_model import evaluate_model
 
 
 def computeMagneticFieldVector(magnitude: float, theta: float, phi: float):
@@ -31,12 +32,20 @@ def computeMagneticFieldVector(magnitude: float, theta: float, phi: float):
         Vector of 3 B field components (Bx,By,Bz), as a np.array, units: [mT]
     """
 
-    x = np.sin(np.radians(theta)) * np.cos(np.radians(phi))
-    y = np.sin(np.radians(theta)) * np.sin(np.radians(phi))
-    z = np.cos(np.radians(theta))
+    # return a zero field for invalid magnitudes instead of propagating NaNs
+    if not math.isfinite(magnitude):
+        return np.zeros(3)
+
+    # convert and evaluate each angle only once, use math for scalars to avoid NumPy's overhead
+    theta, phi = math.radians(theta), math.radians(phi)
+    sin_theta = math.sin(theta)
 
+    x = sin_theta * math.cos(phi)
+    y = sin_theta * math.sin(phi)
+    z = math.cos(theta)
+
+    # the vector is normalized by construction, no need to divide by its norm
     unitVector = np.array((x, y, z))
-    unitVector = unitVector / np.linalg.norm(unitVector)
 
     return np.around(unitVector * magnitude, 3)
 
@@ -55,16 +64,8 @@ def computeCoilCurrents(B_fieldVector,
     - currVector (1d-ndarray of length 3): Estimated current values [A] that are required 
     to generate B_fieldVector 
     """
-    # load the model from disk
-    [loaded_model, loaded_poly] = pickle.load(open(model_filename, 'rb'))
-
-    # preprocess test vectors, st. they have correct shape for model
-    B_fieldVector_reshape = B_fieldVector.reshape((1, 3))
-    test_vectors_ = loaded_poly.fit_transform(B_fieldVector_reshape)
-
-    # estimate prediction of required currents
-    currVector = loaded_model.predict(test_vectors_)
-    currVector = currVector.reshape(3)      # [mA]
+    # estimate prediction of required currents, the model is loaded from disk only once
+    currVector = evaluate_model(model_filename, B_fieldVector)      # [mA]
     currVector = np.round(currVector, 3)    # round to nearest milliamp
 
     return currVector
@@ -82,11 +83,18 @@ def spherical_to_cartesian(spherical_coords: np.ndarray) -> np.ndarray:
     # explicitly define spherical coordinates to prevent misconfusions
     magnitude, theta, phi = spherical_coords
 
-    cartesian_vector = np.array([  np.sin(np.radians(theta)) * np.cos(np.radians(phi)),
-                                    np.sin(np.radians(theta)) * np.sin(np.radians(phi)),
-                                    np.cos(np.radians(theta))])
+    # return a zero field for invalid magnitudes instead of propagating NaNs
+    if not math.isfinite(magnitude):
+        return np.zeros(3)
+
+    # evaluate each trigonometric function only once, use math for scalars to avoid NumPy's overhead
+    theta, phi = math.radians(theta), math.radians(phi)
+    sin_theta = math.sin(theta)
+
+    cartesian_vector = np.array([sin_theta * math.cos(phi), sin_theta * math.sin(phi), math.cos(theta)])
 
-    cartesian_vector = magnitude* cartesian_vector / np.linalg.norm(cartesian_vector)
+    # the vector is normalized by construction, no need to divide by its norm
+    cartesian_vector = magnitude* cartesian_vector
     return np.around(cartesian_vector, 3)
 
 
@@ -0,0 +1,31 @@
+import pickle
+import functools
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def load_model(filepath: str) -> tuple:
+    """Load a fitted polynomial model from disk and extract its parameters. The result is cached,
+    such that each file is only read once, even if it is used by multiple callers.
+
+    :param filepath: path of the pickled [model, polynomial features] pair
+    :returns: (coefficients, intercept, powers), where powers are the exponents of the inputs for each feature
+    """
+    with open(filepath, 'rb') as file:
+        loaded_model, loaded_poly = pickle.load(file)
+    return loaded_model.coef_, loaded_model.intercept_, loaded_poly.powers_
+
+
+def evaluate_model(filepath: str, vector: np.ndarray) -> np.ndarray:
+    """Evaluate the model stored at filepath for a single input vector of length 3.
+
+    :param filepath: path of the pickled [model, polynomial features] pair
+    :param vector: input of the model, e.g. a field vector in mT or a current vector in A
+    :returns: prediction of the model
+    """
+    coefficients, intercept, powers = load_model(filepath)
+
+    # compute polynomial features (monomials of the inputs) and apply the linear model directly
+    features = np.prod(np.reshape(vector, 3) ** powers, axis=1)
+
+    return intercept + coefficients @ features
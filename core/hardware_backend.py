@@ -1,14 +1,26 @@
+import math
+import atexit
+import weakref
 import threading
 import numpy as np
-from time import sleep
+from time import sleep, monotonic
+from concurrent.futures import ThreadPoolExecutor, wait
 from PyQt5.QtCore import pyqtSignal
 
 from core.itech_driver import ITPowerSupplyDriver, OutputState
-from core.backend_base import MagnetBackendBase, ObserverThread
+from core.backend_base import MagnetBackendBase, TaskObserver, DEMAG_FACTORS
 from core.backend_base import MAGNET_STATE as MagnetState
 from core.backend_base import CURRENT_TASK as CurrentTask
 
 
+def _call_at_exit(method_ref : weakref.WeakMethod):
+    """Call a weakly referenced method at interpreter exit, if its instance still exists.
+    """
+    method = method_ref()
+    if method is not None:
+        method()
+
+
 class ElectroMagnetBackend(MagnetBackendBase):
     """Backend for controlling the three power supplies of the VM.
     Functions for setting the current or demagnetizing the coils are wrapped by this class.
@@ -27,8 +39,10 @@ class ElectroMagnetBackend(MagnetBackendBase):
         """
         super().__init__()
 
-        # Initialise state.
-        self._setpoint_currents = np.array([0, 0, 0], dtype=float)
+        # Initialise state, setpoints are preallocated and updated in place, zero currents are a shared read-only array
+        self._zeros = np.zeros(3, dtype=float)
+        self._zeros.flags.writeable = False
+        self._setpoint_currents = np.zeros(3, dtype=float)
         self._setpoint_fields = np.array([0, 0, 0], dtype=float)
         self._magnet_state = MagnetState.OFF
         self._demagnetization_flag = False
@@ -42,18 +56,28 @@ class ElectroMagnetBackend(MagnetBackendBase):
         self.IPs = ['169.254.237.47', '169.254.237.48', '169.254.237.49']
 
         # connect to power supplies
-        self.power_supplies = np.empty(self._number_channels, dtype= ITPowerSupplyDriver)
-        for i in range(self._number_channels):
-            self.power_supplies[i] = ITPowerSupplyDriver(i,   self.IPs[i], 
-                                                                self.port, 
-                                                                self.maxCurrent, 
-                                                                self.maxVoltage)
+        self.power_supplies = [ITPowerSupplyDriver(i,   self.IPs[i], 
+                                                        self.port, 
+                                                        self.maxCurrent, 
+                                                        self.maxVoltage) for i in range(self._number_channels)]
+
+        # persistent thread pool for ramping, which is reused for all ramps, and futures of the running ramping jobs
+        self._ramp_pool = ThreadPoolExecutor(max_workers=self._number_channels, thread_name_prefix='ramp')
+        self._ramp_futures = []
 
-        # thread pool for ramping
-        self.ramping_threads = np.empty(self._number_channels, dtype = CurrentRampingHardwareThread)
+        # separate thread pool for measurements, st. they are not queued behind running ramping jobs
+        self._query_pool = ThreadPoolExecutor(max_workers=self._number_channels, thread_name_prefix='query')
+
+        # stop event shared by all ramping jobs, setting it once terminates all of them early
+        self._ramp_stop_event = threading.Event()
 
         # open connection to power supplies
         self.open_connection()
+        self._closed = False
+
+        # make sure that the supplies are released when the interpreter exits without close being called.
+        # The handler only holds a weak reference, st. a discarded backend can still be collected
+        atexit.register(_call_at_exit, weakref.WeakMethod(self._close_at_exit))
 
         # catch signal emitted when a task is finished
         self.on_task_finished.connect(self.on_task_finished_action)
@@ -66,28 +90,69 @@ class ElectroMagnetBackend(MagnetBackendBase):
     def ramp_num_steps(self, num_steps: int):
         self._ramp_num_steps = num_steps
 
-    def __del__(self):
-        """
+    def close(self):
+        """Disable the field if necessary, disconnect from the power supplies and shut down the thread pools.
+        It is safe to call this method multiple times.
         """
+        if self._closed:
+            return
+
         if self._magnet_state == MagnetState.ON:
             # enforce that no demagnetization happens when window is suddenly closed
             self._demagnetization_flag = False
             self.disable_field()
 
-            # wait until all threads have exited, else threads will run into errors after disconnecting 
-            for thread in self.ramping_threads:
-                thread.join()
+        # wait until all jobs have finished, else they will run into errors after disconnecting.
+        # Afterwards, no new ramps are accepted
+        wait(self._ramp_futures)
+        self._closed = True
 
         # disconnect from power supplies
         self.close_connection()
+        self._ramp_pool.shutdown(wait=True)
+        self._query_pool.shutdown(wait=True)
+
+
+    def _close_at_exit(self):
+        """Release the power supplies at interpreter exit if close has not been called. At this point, the thread pools 
+        do not accept new jobs anymore, hence running jobs are stopped and the channels are closed sequentially. 
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        self._ramp_stop_event.set()
+        wait(self._ramp_futures)
+        for channel in self.power_supplies:
+            self._close_channel(channel)
+
+
+    def __del__(self):
+        """Best-effort cleanup, prefer calling close explicitly.
+        """
+        try:
+            self.close()
+        except Exception:
+            pass
 
 
     def open_connection(self):
         """Open a connection to each IT6432 current source.
         """
         print(f"BAK :: magnet ({self.name}) :: open_connection")
-        for channel in self.power_supplies:
-            channel.connect()
+        # the power supplies are independent, hence connect to all of them concurrently
+        # st. the round trips of the individual connections overlap
+        with ThreadPoolExecutor(max_workers=self._number_channels) as executor:
+            list(executor.map(self._open_channel, self.power_supplies))
+
+
+    @staticmethod
+    def _open_channel(channel : ITPowerSupplyDriver):
+        """Open a connection to a single IT6432 current source and switch it to remote mode.
+        """
+        channel.connect()
+        # send the commands as compound messages, the query of the output state carries the mode switch
+        with channel.batch():
             channel.set_operation_mode('remote')
             if channel.get_output_state() == OutputState.ON:
                 channel.disable_output()
@@ -97,11 +162,22 @@ class ElectroMagnetBackend(MagnetBackendBase):
         """Close the connection with the current sources.
         """
         print(f"BAK :: magnet ({self.name}) :: close_connection")
-        for channel in self.power_supplies:
+        # disconnect from all power supplies concurrently, analogously to opening the connections
+        with ThreadPoolExecutor(max_workers=self._number_channels) as executor:
+            list(executor.map(self._close_channel, self.power_supplies))
+
+
+    @staticmethod
+    def _close_channel(channel : ITPowerSupplyDriver):
+        """Disable the output of a single IT6432 current source, switch it back to local mode and close the connection.
+        """
+        if not channel.connected:
+            return
+        with channel.batch():
             if channel.get_output_state() == OutputState.ON:
                 channel.disable_output()
             channel.set_operation_mode('local')
-            channel.close() 
+        channel.close() 
 
 
     def get_currents(self) -> np.ndarray:
@@ -109,11 +185,16 @@ class ElectroMagnetBackend(MagnetBackendBase):
 
         """
         if self._magnet_state == MagnetState.ON:
-            currents = np.array([self.power_supplies[i].get_current() for i in range(self._number_channels)])
+            # query all power supplies concurrently, st. the round trips overlap
+            futures = [self._query_pool.submit(channel.get_current) for channel in self.power_supplies]
+            currents = np.empty(self._number_channels)
+            for i, future in enumerate(futures):
+                currents[i] = future.result()
         else:
             currents = np.zeros(3)
         
-        return np.round(currents, 3)
+        # round in place, the array is created per call since callers may modify the result
+        return np.round(currents, 3, out=currents)
 
 
     def set_currents(self, values: np.ndarray):
@@ -121,9 +202,13 @@ class ElectroMagnetBackend(MagnetBackendBase):
 
         :param values: Current values to be set.
         """
-        self._setpoint_currents = values
+        values = np.asarray(values, dtype=float)
 
-        if self._magnet_state == MagnetState.ON:
+        # skip ramping if the setpoint has not changed, unless a demagnetization is requested
+        unchanged = np.allclose(values, self._setpoint_currents, rtol=0, atol=1e-4) and not self._demagnetization_flag
+        np.copyto(self._setpoint_currents, values)
+
+        if self._magnet_state == MagnetState.ON and not unchanged:
             self.on_task_change.emit(CurrentTask.SWITCHING)
             self._ramp_to_new_current_values(self._setpoint_currents, CurrentTask.SWITCHING)
             
@@ -143,7 +228,7 @@ class ElectroMagnetBackend(MagnetBackendBase):
         """
          # ramp currents down to zero, note that demagnetization is handled implicitly 
         # and outputs of current supplies are disabled at the end.  
-        self._ramp_to_new_current_values(np.array([0, 0, 0], dtype=float), CurrentTask.DISABLING, emit_signals_flag = True)
+        self._ramp_to_new_current_values(self._zeros, CurrentTask.DISABLING, emit_signals_flag = True)
 
         self._magnet_state = MagnetState.OFF
         # self.on_field_status_change.emit(MagnetState.OFF)
@@ -196,73 +281,76 @@ class ElectroMagnetBackend(MagnetBackendBase):
             This flag is intented to be used when disabling the magnet, since current updates should be switched off 
             when the magnet is off, but the process of driving the currents to zero should still be monitored.
         """
-        try:
-            # if threads are still running, initiate early stop by setting stop
-            for thread in self.ramping_threads:
-                if thread.is_alive():
-                    thread.stop()
-
-            # wait until all threads have exited 
-            for thread in self.ramping_threads:
-                thread.join()
-        except AttributeError:
-            pass
+        # the thread pools are shut down once the backend is closed
+        if self._closed:
+            print(f"BAK :: magnet ({self.name}) :: closed, ignore request to ramp currents")
+            return
+
+        # if jobs are still running, initiate early stop by setting the shared stop event
+        self._ramp_stop_event.set()
+
+        # wait until all jobs have finished, then rearm the stop event for the next jobs
+        wait(self._ramp_futures)
+        self._ramp_stop_event.clear()
         
         # emit signal to herald a new task
         if self._demagnetization_flag:
-            self.frontend.on_task_change.emit(CurrentTask.DEMAGNETIZING)
+            self.on_task_change.emit(CurrentTask.DEMAGNETIZING)
         else:
-            self.frontend.on_task_change.emit(running_task)
+            self.on_task_change.emit(running_task)
 
-        # if desired, pass the on_single_current_change attribute to the individual threads
+        # if desired, pass the on_single_current_change attribute to the individual jobs
         if emit_signals_flag:
             signal = self.on_single_current_change
         else:
             signal = None
 
-        # initialize threads that ramp current from initial to final value
-        for i in range(3):
-            self.ramping_threads[i] = CurrentRampingHardwareThread(self.power_supplies[i], target_currents[i], 
-                                            number_steps = self.ramp_num_steps, signal = signal,
-                                            demagnetization_flag = self._demagnetization_flag)
-
-        # start the threads
-        for thread in self.ramping_threads:
-            thread.start()
-
-        # start the observer of the three threads
-        self.observer = ObserverThread(self.ramping_threads, running_task, self.on_task_finished, 
+        # the observer is notified by the jobs and emits a signal once all of them have finished
+        observer = TaskObserver(self._number_channels, running_task, self.on_task_finished, 
                     check_demagnetization = self._demagnetization_flag)
-        self.observer.start()
+
+        # initialize jobs that ramp current from initial to final value and submit them to the thread pool
+        ramping_jobs = [CurrentRampingHardwareJob(self.power_supplies[i], target_currents[i], 
+                                            self._ramp_stop_event, 
+                                            number_steps = self.ramp_num_steps, signal = signal,
+                                            demagnetization_flag = self._demagnetization_flag, observer = observer)
+                                        for i in range(self._number_channels)]
+        self._ramp_futures = [self._ramp_pool.submit(job.run) for job in ramping_jobs]
 
 
 
-class CurrentRampingHardwareThread(threading.Thread):
-    """Thread class that ramps the output current of a single power supply from an initial to 
-    the provided final value. The class has a stop method, which invokes an early but secure termination 
-    after finishing the currently executed ramping step.  
+class CurrentRampingHardwareJob(object):
+    """Job that ramps the output current of a single power supply from an initial to 
+    the provided final value, meant to be executed by a worker thread of a pool. 
+    Setting the stop event invokes an early but secure termination after finishing the currently executed ramping step.  
 
     """
-    def __init__(self, device : ITPowerSupplyDriver, target_current : float, 
+    def __init__(self, device : ITPowerSupplyDriver, target_current : float, stop_event : threading.Event,
                     signal : pyqtSignal = None, demagnetization_flag = False,
-                    number_steps: int = 5, *args, **kwargs):
+                    number_steps: int = 5, observer : TaskObserver = None):
         """
         Instance constructor.
         
         :param device: driver for respective power supply
+        :param target_current: current value which should be obtained at the end
+        :param stop_event: Event which terminates the job early once it is set. It may be shared with other jobs.
         :param number_steps (optional): Number of steps used for ramping.
         :param signal (optional): pyqtSignal to emit after each step. The signal argument must be of type np.array.
         :param demagnetization_flag (optional): If flag is True, a demagnetization procedure is applied to the coi prior to ramping.
+        :param observer (optional): TaskObserver which is notified once demagnetization has been passed and once the job finishes.
         """
-        super().__init__(*args, **kwargs)
 
         # initialize variables 
         self.device = device
         self.number_steps = number_steps
         self._signal = signal
         self._demagnetization_flag = demagnetization_flag
-        self._demagnetization_passed = False
-        self._stop_event = threading.Event()
+        self._stop_event = stop_event
+        self._observer = observer
+
+        # minimum time between two intermediate signal emissions [s] and time of the last one
+        self._emit_interval = 0.05
+        self._last_emit = 0.0
 
         # for ensuring either current or voltage compliance, either an overestimated or underestimated voltage is required,
         # hence two estimates of the coil's resistance are defined here
@@ -272,7 +360,7 @@ class CurrentRampingHardwareThread(threading.Thread):
         # save target current as positive number and pass its original sign to the estimated voltage.
         # use overestimate of resistance to ensure current compliance here
         self.target_current = abs(target_current)
-        self.target_voltage = np.sign(target_current) * self.R_coils_overestimate * self.target_current
+        self.target_voltage = math.copysign(self.R_coils_overestimate * self.target_current, target_current)
 
         # check target current and voltage values, redefine if they are outside the allowed limits
         self._check_values()
@@ -281,45 +369,62 @@ class CurrentRampingHardwareThread(threading.Thread):
     def _check_values(self):
         """Check whether target current and voltage are within the allowed limits, if not set to limits.
         """
-        # check for too large value
-        if self.target_current > self.device.current_lim:
-            self.target_current = self.device.current_lim
-            print('target current exdeeds limit')
-        if abs(self.target_voltage) > self.device.voltage_lim:
-            self.target_voltage = self.device.voltage_lim
-            print('target voltage exdeeds limit')
-
-        # if target is close to zero current or voltage, set to minimum values accepted by driver
-        if self.target_current < 0.002 or abs(self.target_voltage) < 0.001:
-            self.target_current = 0.002
-            self.target_voltage = 0
+        abs_voltage = abs(self.target_voltage)
+        if self.target_current > self.device.current_lim or abs_voltage > self.device.voltage_lim:
+            print('target current or voltage exdeeds limit')
 
+        # clamp too large values to the limits, the voltage keeps its sign
+        self.target_current = min(self.target_current, self.device.current_lim)
+        abs_voltage = min(abs_voltage, self.device.voltage_lim)
+        self.target_voltage = math.copysign(abs_voltage, self.target_voltage)
 
-    def stop(self):
-        """Set the stop event. 
-        """
-        self._stop_event.set()
+        # if target is close to zero current or voltage, set to minimum values accepted by driver
+        if self.target_current < 0.002 or abs_voltage < 0.001:
+            self.target_current, self.target_voltage = 0.002, 0.0
 
 
     def run(self):
-        """Overwrite run method to define the thread's purpose. If a stop event is set while the thread is running, 
-        the current ramping step is finalized and the thread will be terminated before starting the next ramping step. 
+        """Execute the job. If the stop event is set while the job is running, 
+        the current ramping step is finalized and the job will be terminated before starting the next ramping step. 
         """
-        # clear output of device in case it has been locked due to some previous error
-        self.device.clrOutputProt()
-
-        # if the output is currently off, set voltage limit to zero before enabling output
-        if self.device.get_output_state() == OutputState.OFF:
-            self.device.set_voltage(0)
-            self.device.enable_output()
-
-        # measure the current output
-        initial_current = self.device.get_current()
-
-        # if desired run the demagnetization procedure first
-        if self._demagnetization_flag and not np.isclose(0, initial_current, atol=0.01):
-            self._demagnetization_procedure()
-        self._demagnetization_passed = True
+        try:
+            self._ramp()
+        except Exception as err:
+            # the future of the job keeps the exception, hence report it here st. it does not pass unnoticed
+            print(f'BAK :: ramping job (ch {self.device.channel}) :: {err!r}')
+            raise
+        finally:
+            # also notify the observer if an error occurred, else the task would never be finished
+            if self._observer is not None:
+                self._observer.finished()
+
+
+    def _ramp(self):
+        """Ramp the current to the target value, including the demagnetization procedure if desired.
+        """
+        try:
+            # clear output of device in case it has been locked due to some previous error
+            self.device.clrOutputProt()
+
+            # if the output is currently off, set voltage limit to zero before enabling output
+            if self.device.get_output_state() == OutputState.OFF:
+                with self.device.batch():
+                    self.device.set_voltage(0)
+                    self.device.enable_output()
+
+            # measure the current output
+            initial_current = self.device.get_current()
+
+            # if desired run the demagnetization procedure first
+            if self._demagnetization_flag and abs(initial_current) > 0.01:
+                self._demagnetization_procedure()
+
+                # commands are sent without checking for errors, hence report errors of the procedure here
+                self.device.checkError()
+        finally:
+            # also notify the observer if an error occurred, else it would wait forever
+            if self._observer is not None:
+                self._observer.demagnetization_passed()
         
         # ensure device works in voltage compliance, take an intermediate step if this isn't the case yet
         self._ensure_voltage_compliance(initial_current)
@@ -339,6 +444,10 @@ class CurrentRampingHardwareThread(threading.Thread):
             else:
                 self._linarly_ramp_voltage(self.target_voltage)
 
+        # report errors of the commands sent without checking during this ramp, st. they are not 
+        # raised by a later, unrelated query
+        self.device.checkError()
+
 
     def _ensure_voltage_compliance(self, initial_current : float):
         """Ensure that power supplies works in voltage compliance afterwards. 
@@ -350,7 +459,7 @@ class CurrentRampingHardwareThread(threading.Thread):
         # if target current is below initial current (absolute numbers), bring voltage down to slightly below the target voltage first
         if self.target_current  < abs(initial_current):
             # ramp voltage below target voltage by taking an intermediate step
-            intermediate_voltage = np.sign(self.target_voltage) * self.R_coils_underestimate * self.target_current if self.target_current > 0.02 else 0
+            intermediate_voltage = math.copysign(self.R_coils_underestimate * self.target_current, self.target_voltage) if self.target_current > 0.02 else 0.0
             self._linarly_ramp_voltage(intermediate_voltage)
 
         # only proceed if the stop has not been set already
@@ -358,68 +467,79 @@ class CurrentRampingHardwareThread(threading.Thread):
 
             # wait until target_current > currently_set_current is indeed satisfied, it may take a moment for the hardware to respond
             repeat_count = 0
-            meas_current_queue = [self.device.get_current(), 0]
-            while  self.target_current <= abs(meas_current_queue[0]) and repeat_count < 5:
-                meas_current_queue.insert(0, self.device.get_current())
-                meas_current_queue.pop(2)
-                if abs(meas_current_queue[0] - meas_current_queue[1]) < 0.002:
+            poll_interval = 0.01 # [s]
+            meas_current = self.device.get_current()
+            while  self.target_current <= abs(meas_current) and repeat_count < 5:
+                # give the hardware some time before measuring again, exit immediately if stop event is set meanwhile
+                if self._stop_event.wait(poll_interval):
+                    break
+
+                # keep the latest and the previous measurement
+                meas_current, previous_current = self.device.get_current(), meas_current
+                if abs(meas_current - previous_current) < 0.002:
+                    # current has settled, poll less frequently 
                     repeat_count += 1
+                    poll_interval = min(2 * poll_interval, 0.1)
                 else:
                     repeat_count = 0
+                    poll_interval = 0.01
 
 
-    def _linarly_ramp_voltage(self, target_voltage : float):
+    def _linarly_ramp_voltage(self, target_voltage : float, initial_voltage : float = None, emit_each_step = True):
         """Ramp the voltage of the power supply to a provided target value.
         It is recommended to only call this function when device is in voltage compliance.
 
         :param target_voltage: desired final voltage
+        :param initial_voltage (optional): voltage that is currently set, e.g. the target of a previous ramp. 
+            If not provided, the output voltage is measured and set.
+        :param emit_each_step (optional): If False, the signal is only emitted after the last step, which saves 
+            a current measurement per intermediate step. Else, intermediate steps are emitted at most once per emit interval.
         """
-        # set voltage to the current output voltage (ensures voltage compliance)
-        initial_voltage = self.device.get_voltage()
-        self.device.set_voltage(initial_voltage)
+        if initial_voltage is None:
+            # set voltage to the current output voltage (ensures voltage compliance)
+            initial_voltage = self.device.get_voltage()
+            self.device.set_voltage(initial_voltage)
         
-        # estimate current distance to target and set step size
-        step_size = (target_voltage - initial_voltage) / self.number_steps
+        # precompute the voltage of each step, the last one being exactly the target voltage
+        voltages = np.linspace(initial_voltage, target_voltage, self.number_steps + 1)[1:].tolist()
+        last_step = len(voltages) - 1
 
-        for i in range(self.number_steps):
+        # bind frequently used attributes locally to save lookups within the loop
+        device = self.device
+        stopped = self._stop_event.is_set
+        emit = self._signal.emit if self._signal is not None else None
+
+        for i, voltage in enumerate(voltages):
             # exit loop if stop event has been set and set current to the currently measured value
-            if self._stop_event.is_set():
-                self.device.set_current(self.device.get_current())
+            if stopped():
+                device.set_current(device.get_current())
                 break
             
-            # raise voltage by one step
-            self.device.set_voltage(initial_voltage + (i+1)*step_size)
-
-            # send a signal with array of current values as arguments if provided
-            if self._signal is not None:
-                self._signal.emit(self.device.get_current(), self.device._channel)
-
+            # raise voltage by one step and send a signal with the measured current as argument if provided.
+            # intermediate steps are rate limited, since each emission requires a current measurement
+            now = monotonic()
+            if emit is not None and (i == last_step or (emit_each_step and now - self._last_emit >= self._emit_interval)):
+                emit(device.set_voltage_and_measure_current(voltage), device._channel)
+                self._last_emit = now
+            else:
+                device.set_voltage(voltage)
 
-    def demagnetization_completed(self) -> bool:
-        """Return whether demagnetization has been completed. 
-        """
-        return self._demagnetization_passed
 
-        
     def _demagnetization_procedure(self):
         """Apply a demagnetization procedure, which performs an approximation of a damped oscillation.
         Eventually, zero current is applied and the remnant magnetization ideally zero, too. 
         The initial amplitude is the currently applied current. 
 
         """   
-        # initialize vertices of damped osciallation which are to be approached during the procedure
-        reference_points = np.array([0.2, 1, 2, 3, 4, 5, 6, 7, 8])
-        factors = np.exp(-0.7 * reference_points)
-
         # set current to max, st. power supply works in voltage compliance
         self.device.set_current(5.01)
 
         # measure currently set output current
         initial_current = self.device.get_current()
 
-        # estimate vertices of oscillation and alternatingly flip sign of amplitude, add zero at the end
-        vertices = initial_current * factors * (-1)**np.arange(1, len(factors)+1)
-        vertices = np.append(vertices, 0)
+        # estimate vertices of oscillation which are to be approached during the procedure, the last vertex is zero.
+        # Convert them to Python floats, which are passed on to the driver
+        vertices = (initial_current * DEMAG_FACTORS).tolist()
 
         for i in range(len(vertices)):
 
@@ -427,11 +547,14 @@ class CurrentRampingHardwareThread(threading.Thread):
             if self._stop_event.is_set():
                 break
 
-            # ramp to next vertex
-            self._linarly_ramp_voltage(vertices[i])
+            # ramp to next vertex, starting from the previous vertex which is known to be set already.
+            # Only report the currents at the vertices to reduce the number of measurements and signals
+            self._linarly_ramp_voltage(vertices[i], initial_voltage = vertices[i-1] if i > 0 else None, 
+                                        emit_each_step = False)
 
-            # ensure that vertex is actually approached
-            sleep(0.1)
+            # ensure that vertex is actually approached, a stop request interrupts the waiting
+            if self._stop_event.wait(0.1):
+                break
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import socket
 from time import sleep, time
 from threading import RLock
+from contextlib import contextmanager
 import enum
 import logging 
 logging.basicConfig(level=logging.DEBUG)
@@ -34,13 +35,25 @@ class ITPowerSupplyDriver(object):
         self._channel = channel
         self._connected = False
 
-        # connection settings
-        self._sock = socket.socket()
+        # connection settings, the socket gets created once connecting to hardware
+        self._sock = None
         self._host = IP_address
         self._port = port
         self._timeout = 10.0
         self._read_termination = '\n'
-        self._chunk_size = 1024
+        self._termination_bytes = self._read_termination.encode('ascii')
+        self._chunk_size = 4096
+        self._receive_buffer_size = 65536
+
+        # buffered reader on top of the socket, gets created once connecting to hardware
+        self._rfile = None
+
+        # commands collected while batching and whether an error check is requested for them, None if not batching
+        self._batch = None
+        self._batch_check_error = False
+
+        # maximum number of entries read from the error queue at once
+        self._max_queued_errors = 16
 
         # hardware limits for current and voltage, get updated once connecting to hardware
         self.MAX_CURR = 0
@@ -71,20 +84,43 @@ class ITPowerSupplyDriver(object):
         return self._connected
 
 
+    def __enter__(self):
+        self.connect()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
     def connect(self):
-        """Connect to the device
+        """Connect to the device. Nothing happens if the device is connected already, 
+        after closing the connection it can be reestablished by calling this method again.
 
         """
+        if self._connected:
+            return
+
         logging.debug(f'DRV :: IT6432 :: connect :: CH {self._channel}')
         try:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+            # send each (short) command immediately instead of coalescing it with subsequent ones,
+            # and keep the connection alive during long idle periods
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._receive_buffer_size)
             self._sock.connect((self._host, self._port))
 
         except Exception as err:
             logging.error(err)
+            self._close_socket()
 
         else:
             self._connected = True
             self._sock.settimeout(self._timeout)
+            self._rfile = self._sock.makefile('rb', buffering=self._chunk_size)
 
             limits = self.getMaxMinOutput()
             self.MAX_CURR = limits[0]
@@ -92,41 +128,71 @@ class ITPowerSupplyDriver(object):
 
 
     def close(self):
-        """Closes the socket connection
+        """Closes the socket connection. Nothing happens if the device is not connected.
         """
+        if self._sock is None:
+            return
+
         logging.debug(f'DRV :: IT6432 :: close :: CH {self._channel}')
-        self._sock.close()
+        self._close_socket()
+
 
+    def _close_socket(self):
+        """Close the socket and the associated reader, st. a new socket is created when connecting again.
+        """
+        if self._rfile is not None:
+            self._rfile.close()
+            self._rfile = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._connected = False
 
-    def _send(self, cmd: str, check_error: bool = True):
+
+    def _send(self, cmd: str, check_error: bool = False):
         """Writes command as ascii characters to the instrument.
-        If there is an error, it is saved to the log.
+        If there is an error, it is saved to the log. Errors of the instrument are not checked 
+        by default, use checkError at the end of a sequence of commands instead.
 
         :param cmd: an SCPI command
         :type cmd: str
-        :param check_error: whether to check for errors explicitly, defaults to True.
+        :param check_error: whether to check for errors explicitly, defaults to False.
         :type check_error: bool, optional
         
         :raise: BaseException: if check_error is true and an error occurred. 
         """
-        # add command termination
-        cmd += self._read_termination
-        try:
-            with self.lock_sending:
-                self._sock.sendall(cmd.encode('ascii'))
-        except (ConnectionResetError, ConnectionError, ConnectionRefusedError, ConnectionAbortedError) as err:
-            logging.error(f'error on (ch {self._channel}) in _send: cmd= {cmd[:-1]}, err= {err}')
+        with self.lock_sending:
+            if self._batch is not None:
+                # collect command, it is sent together with the other commands when the batch ends
+                self._batch.append(cmd)
+                self._batch_check_error = self._batch_check_error or check_error
+                return
+
+            self._write(cmd)
 
         if check_error:
             self.checkError()
 
 
-    def _recv(self, chunk_size: int = 1024, check_error: bool = True) -> str:
-        """Reads message sent from the instrument on the connection, one chunk (1024 bytes) at a time.
+    def _write(self, cmd: str):
+        """Writes command as ascii characters to the instrument right away, regardless of a running batch.
 
-        :param chunk_size: expected chunk size to be received. Defaults to 0.
-        :type chunk_size: int, optional
-        :param check_error: whether to check for errors explicitly, defaults to True.
+        :param cmd: an SCPI command
+        :type cmd: str
+        """
+        try:
+            with self.lock_sending:
+                # add command termination
+                self._sock.sendall(cmd.encode('ascii') + self._termination_bytes)
+        except (ConnectionResetError, ConnectionError, ConnectionRefusedError, ConnectionAbortedError) as err:
+            logging.error(f'error on (ch {self._channel}) in _send: cmd= {cmd}, err= {err}')
+
+
+    def _recv(self, check_error: bool = False) -> str:
+        """Reads a message sent from the instrument on the connection up to the termination character.
+        The socket is read via a buffered file object, st. a reply is usually obtained with a single system call.
+
+        :param check_error: whether to check for errors explicitly, defaults to False.
         :type check_error: bool, optional
         
         :raise: BaseException: if check_error is true and an error occurred. 
@@ -135,33 +201,22 @@ class ITPowerSupplyDriver(object):
         :rtype: str
 
         """
-        read_len = 0
-        chunk = bytes()
-
         try:
-            while True:
-                to_read_len = chunk_size - read_len
-                if to_read_len <= 0:
-                    break
-                data = self._sock.recv(to_read_len)
-                chunk += data
-                read_len += len(data)
-                term_char = self._read_termination.encode()
-                if term_char in data:
-                    term_char_ix = data.index(term_char)
-                    read_len = term_char_ix + 1
-                    break
-                else:
-                    pass
-
-        except socket.timeout:
-            logging.error(f'DRV :: IT6432 :: {__name__} Timeout occurred on CH {self._channel}')
+            chunk = self._rfile.readline()
+        except OSError as err:
+            # socket.timeout is a subclass of OSError
+            logging.error(f'DRV :: IT6432 :: {__name__} error {err!r} occurred on CH {self._channel} while receiving')
+
+            # a file object of a socket refuses to read after a timeout, hence replace it to allow further queries
+            if self._sock is not None:
+                self._rfile.close()
+                self._rfile = self._sock.makefile('rb', buffering=self._chunk_size)
             return ''
 
         try:
             res = chunk.decode('ascii').strip('\n')
         except UnicodeDecodeError:
-            res = chunk.decode('uft8').strip('\n')
+            res = chunk.decode('utf8').strip('\n')
             logging.error(f'DRV :: IT6432 :: {__name__} Non-ascii string received on CH {self._channel}: {res}')
 
         if check_error:
@@ -171,7 +226,8 @@ class ITPowerSupplyDriver(object):
 
 
     def _send_and_recv(self, cmd: str, check_error: bool = True) -> str:
-        """Query the current source with any command
+        """Query the current source with any command. If errors should be checked, the status byte 
+        is queried within the same message, st. the check does not require an additional round trip.
 
         :param cmd: an SCPI command
         :type cmd: int
@@ -186,15 +242,52 @@ class ITPowerSupplyDriver(object):
         """
         result = None
         with self.lock_receiving:
-            self._send(cmd, check_error=False)
-            result = self._recv(check_error=False)
+            if self._batch:
+                # commands collected by a running batch precede the query within the same message
+                cmd = ';:'.join(self._batch + [cmd])
+                self._batch.clear()
+
+            if check_error:
+                self._write(f'{cmd};*STB?')
+                result, _, status_byte = self._recv(check_error=False).rpartition(';')
+            else:
+                self._write(cmd)
+                result = self._recv(check_error=False)
             
         if check_error:
-            self.checkError()
+            self._check_status_byte(status_byte)
 
         return result
 
 
+    @contextmanager
+    def batch(self):
+        """Collect the commands sent within the context and send them as a single compound message when 
+        leaving it, which saves a system call and a network packet per command. Queries within the context 
+        are sent together with the commands collected so far. Requested error checks are deferred to the end.
+
+        Usage: 
+            with driver.batch():
+                driver.set_voltage(0)
+                driver.enable_output()
+        """
+        # hold both locks st. no other thread can send or receive in between
+        with self.lock_receiving, self.lock_sending:
+            if self._batch is not None:
+                # already batching, the outer context sends the commands
+                yield self
+                return
+
+            self._batch, self._batch_check_error = [], False
+            try:
+                yield self
+            finally:
+                commands, check_error = self._batch, self._batch_check_error
+                self._batch = None
+                if commands:
+                    self._send(';:'.join(commands), check_error=check_error)
+
+
     def clrOutputProt(self):
         """Clear output protection of current supply.
         """
@@ -248,6 +341,22 @@ class ITPowerSupplyDriver(object):
         self._send(f'voltage {value:.3f}V')
 
 
+    def set_voltage_and_measure_current(self, value:float) -> float:
+        """Set voltage to provided target value and measure the current afterwards. Both commands
+        are sent within the same message, which saves a round trip compared to set_voltage and get_current.
+
+        :param value: new target voltage [V] of current supply
+        :type value: float
+        :raises ExceedsLimits: When provided value exceeds software defined limit.
+
+        :returns: measured current [A]
+        """
+        if value > self.voltage_lim:
+            raise ExceedsLimits
+
+        return float(self._send_and_recv(f'voltage {value:.3f}V;:measure:current?'))
+
+
     def get_current(self, meas_type : str ='') -> float:
         """Perform current measurement and return estimated value
 
@@ -312,7 +421,7 @@ class ITPowerSupplyDriver(object):
 
 
     def disable_output(self):
-        """Enable output of power supply
+        """Disable output of power supply
         """
         self._send("output 0")
 
@@ -332,10 +441,10 @@ class ITPowerSupplyDriver(object):
         :returns: maximum, minimum current, maximum, minimum voltage
         :rtype: float
         """
-        MAX_CURR = self._send_and_recv('current:maxset?', check_error=False)
-        MIN_CURR = self._send_and_recv('current:minset?', check_error=False)
-        MAX_VOLT = self._send_and_recv('voltage:maxset?', check_error=False)
-        MIN_VOLT = self._send_and_recv('voltage:minset?', check_error=False)
+        # query all four values at once, the answers are separated by semicolons
+        res = self._send_and_recv('current:maxset?;:current:minset?;:voltage:maxset?;:voltage:minset?', 
+                                    check_error=False)
+        MAX_CURR, MIN_CURR, MAX_VOLT, MIN_VOLT = res.split(';')
 
         return float(MAX_CURR), float(MIN_CURR), float(MAX_VOLT), float(MIN_VOLT)
 
@@ -356,8 +465,9 @@ class ITPowerSupplyDriver(object):
         else:
             self.current_lim = current_lim
 
-        self._send('current:limit:state ON')
-        self._send(f'current:limit {self.current_lim}')
+        # send both settings as one compound command and check for errors once afterwards
+        self._send(f'current:limit:state ON;:current:limit {self.current_lim}')
+        self.checkError()
 
 
     def set_maximum_voltage(self, voltage_lim: float):
@@ -376,8 +486,9 @@ class ITPowerSupplyDriver(object):
         else:
             self.voltage_lim = voltage_lim
 
-        self._send('voltage:limit:state ON')
-        self._send(f'voltage:limit {self.voltage_lim}')
+        # send both settings as one compound command and check for errors once afterwards
+        self._send(f'voltage:limit:state ON;:voltage:limit {self.voltage_lim}')
+        self.checkError()
 
     
     def set_hardware_limits(self, maxCurrent : float, maxVoltage : float):
@@ -395,7 +506,9 @@ class ITPowerSupplyDriver(object):
 
 
     def checkError(self) -> None:
-        """Check if an error occurred.
+        """Check if an error occurred. The status byte is read first and the error queue 
+        is only queried if the error queue bit (bit 2) is set, which saves a round trip 
+        in the common case without errors.
 
         :raise: self._ErrorFactory:
 
@@ -403,25 +516,46 @@ class ITPowerSupplyDriver(object):
         :rtype: str
 
         """
-        response = self._send_and_recv('system:error?', check_error=False).split(',')
-        if response == ['']:
-            return
+        self._check_status_byte(self._send_and_recv('*STB?', check_error=False))
+
+
+    def _check_status_byte(self, status_byte: str) -> None:
+        """Read the whole error queue if the error queue bit (bit 2) of the provided status byte is set.
+        The queue is emptied completely, st. no stale errors are raised by a later, unrelated check.
+
+        :param status_byte: response to a *STB? query
+        :raise: self._ErrorFactory: for the first relevant error in the queue
+        """
         try:
-            error_code, error_message = response
+            if not int(status_byte) & 0b100:
+                return
         except ValueError:
+            logging.error(f'DRV :: IT6432 :: checkError :: channel = {self._channel}, status byte = {status_byte}')
+
+        first_error = None
+        for _ in range(self._max_queued_errors):
+            # the response has the form <code>,"<message>", code 0 indicates that the queue is empty
+            response = self._send_and_recv('system:error?', check_error=False)
+            if response == '':
+                break
+            code, _, error_message = response.partition(',')
             try:
-                error_code = int(response)
+                error_code = int(code)
             except ValueError:
                 logging.error(f'DRV :: IT6432 :: checkError :: channel = {self._channel}, response = {response}')
-            except Exception as e:
-                logging.error(f'DRV :: IT6432 :: checkError :: channel = {self._channel}, response = {response} - {type(e)}: {e}')
-            else:
-                if int(error_code) != 0 and int(error_code) != 224:
-                    raise self._ErrorFactory(int(error_code), f'(ch {self._channel}): no message provided')
-        else:
-            if int(error_code) != 0 and int(error_code) != 224:
-                raise self._ErrorFactory(int(error_code), error_message)
-            
+                break
+
+            if error_code == 0:
+                break
+            if error_code != 224 and first_error is None:
+                if not error_message:
+                    error_message = f'(ch {self._channel}): no message provided'
+                first_error = self._ErrorFactory(error_code, error_message)
+            elif error_code != 224:
+                logging.error(f'DRV :: IT6432 :: checkError :: channel = {self._channel}, further error: {response}')
+
+        if first_error is not None:
+            raise first_error
 
 
     @staticmethod
@@ -436,22 +570,8 @@ class ITPowerSupplyDriver(object):
         :returns: some subclass of Exception
             
         """
-        errorClasses = {
-            120: ParameterOverflow,
-            130: WrongUnitsForParam,
-            140: ParamTypeError,
-            170: InvalidCommand,
-            224: FrontPanelTimeout,
-            -101: InvalidCharacter,
-            -102: SyntaxErrorSCPI,
-            -150: StringDataError,
-            -200: ExecutionError,
-            -350: ErrorQueueOverrun
-        }
-
-        errorClass = None
-        if code in errorClasses.keys():
-            errorClass = errorClasses[code]
+        errorClass = _ERROR_CLASSES.get(code)
+        if errorClass is not None:
             return errorClass(code)
 
         else:
@@ -519,4 +639,19 @@ class StringDataError(ErrorBase):
 
 
 class FrontPanelTimeout(ErrorBase):
-    pass
\ No newline at end of file
+    pass
+
+
+# IT6432 error codes and the associated exceptions, used by ITPowerSupplyDriver._ErrorFactory
+_ERROR_CLASSES = {
+    120: ParameterOverflow,
+    130: WrongUnitsForParam,
+    140: ParamTypeError,
+    170: InvalidCommand,
+    224: FrontPanelTimeout,
+    -101: InvalidCharacter,
+    -102: SyntaxErrorSCPI,
+    -150: StringDataError,
+    -200: ExecutionError,
+    -350: ErrorQueueOverrun
+}
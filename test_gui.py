@@ -781,5 +781,9 @@ if __name__ == '__main__':
             dialog.show()
             dialog2.show()
 
-            sys.exit(app.exec_())
+            exit_code = app.exec_()
+
+    # release the backend only after the dialogs have disabled the field when exiting their contexts
+    backend.close()
+    sys.exit(exit_code)
 
@@ -0,0 +1,43 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+from core.hardware_backend import CurrentRampingHardwareJob
+
+
+class CheckValuesTest(unittest.TestCase):
+    """Limits applied to the ramp targets in CurrentRampingHardwareJob._check_values.
+    The device is replaced by a stub, since only its soft limits are accessed.
+    """
+
+    def _make_job(self, target_current, current_lim = 5.05, voltage_lim = 2.0):
+        device = SimpleNamespace(current_lim = current_lim, voltage_lim = voltage_lim, channel = 0)
+        return CurrentRampingHardwareJob(device, target_current, threading.Event())
+
+    def test_negative_target_above_voltage_limit_keeps_sign(self):
+        job = self._make_job(-5.0)
+        self.assertEqual(job.target_voltage, -2.0)
+        self.assertEqual(job.target_current, 5.0)
+
+    def test_positive_target_above_voltage_limit(self):
+        job = self._make_job(5.0)
+        self.assertEqual(job.target_voltage, 2.0)
+
+    def test_negative_target_within_limits_is_unchanged(self):
+        job = self._make_job(-1.0)
+        self.assertAlmostEqual(job.target_voltage, -0.62)
+        self.assertEqual(job.target_current, 1.0)
+
+    def test_current_above_limit_is_clamped(self):
+        job = self._make_job(-6.0, voltage_lim = 30)
+        self.assertEqual(job.target_current, 5.05)
+        self.assertAlmostEqual(job.target_voltage, -0.62 * 6.0)
+
+    def test_target_close_to_zero(self):
+        job = self._make_job(-0.001)
+        self.assertEqual(job.target_current, 0.002)
+        self.assertEqual(job.target_voltage, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()